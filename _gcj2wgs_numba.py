@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+
+"""
+Numba ufuncs for the GCJ-02 → WGS-84 inner kernel (optional accelerator).
+
+Both take the offsets (lon - 105, lat - 35) and return the delta to subtract
+from lon / lat. Each one fuses _tlon/_tlat and the magic/sqrtMagic correction
+into a single pass, so no temporary arrays are materialized, and the parallel
+target spreads the work across cores.
+
+Imported lazily by gcj2wgs_array() in the wenzhou_bus_batch_colored*.py
+scripts, only for calls of at least NUMBA_MIN_POINTS points, when numba is
+installed:
+  pip install numba
+"""
+
+import math
+from numba import vectorize, float64
+
+_A = 6378245.0
+_EE = 0.00669342162296594323
+
+@vectorize([float64(float64, float64)], target="parallel", cache=True)
+def _delta_lon(x, y):
+    ret = 300.0 + x + 2.0*y + 0.1*x*x + 0.1*x*y + 0.1*math.sqrt(abs(x))
+    ret += (20.0*math.sin(6.0*x*math.pi) + 20.0*math.sin(x*math.pi))*2.0/3.0
+    ret += (40.0*math.sin(x/3.0*math.pi) + 150.0*math.sin(x/12.0*math.pi) + 300.0*math.sin(x/30.0*math.pi))*2.0/3.0
+    radlat = (y + 35.0) / 180.0 * math.pi
+    magic = math.sin(radlat)
+    magic = 1 - _EE * magic * magic
+    sqrtMagic = math.sqrt(magic)
+    return (ret * 180.0) / (_A / math.cos(radlat) * sqrtMagic * math.pi)
+
+@vectorize([float64(float64, float64)], target="parallel", cache=True)
+def _delta_lat(x, y):
+    ret = -100.0 + 2.0*x + 3.0*y + 0.2*y*y + 0.1*x*y + 0.2*math.sqrt(abs(x))
+    ret += (20.0*math.sin(6.0*x*math.pi) + 20.0*math.sin(2.0*x*math.pi))*2.0/3.0
+    ret += (20.0*math.sin(y*math.pi) + 40.0*math.sin(y/3.0*math.pi))*2.0/3.0
+    ret += (160.0*math.sin(y/12.0*math.pi) + 320*math.sin(y*math.pi/30.0))*2.0/3.0
+    radlat = (y + 35.0) / 180.0 * math.pi
+    magic = math.sin(radlat)
+    magic = 1 - _EE * magic * magic
+    sqrtMagic = math.sqrt(magic)
+    return (ret * 180.0) / ((_A * (1 - _EE)) / (magic * sqrtMagic) * math.pi)
@@ -0,0 +1,10 @@
+# Builds the optional compiled gcj2wgs kernel next to the scripts:
+#   pip install cython
+#   python setup.py build_ext --inplace
+from setuptools import setup
+from Cython.Build import cythonize
+
+setup(
+    name="wenzhou-bus-gcj2wgs",
+    ext_modules=cythonize("_gcj2wgs.pyx", language_level=3),
+)